@@ -1,4 +1,7 @@
-from .src import fits_input
+from .src import fits_input, remote, arrow_export
 from .src.fits_input import (load_fits_spectrum, load_fits_explicit,
                              identify_column_names, format_fits_info,
+                             get_layout_template, load_fits_explicit_batch,
                              FormatError, WavelengthError, MultipleSpectraWarning)
+from .src.remote import RangeReader, ConnectionPool, load_remote_batch, read_table_columns
+from .src.arrow_export import table_to_arrow, spectra_to_arrow, table_batch_reader, spectrum_batch_reader
@@ -0,0 +1,318 @@
+# jkrogager/fitsutil/src/arrow_export.py
+"""
+Export FITS tables and loaded spectra to Apache Arrow.
+
+The data are converted in chunks of rows (or spectra) to Arrow record batches
+and can be written to an Arrow IPC file or a Parquet file, so that large
+tables never have to be loaded into memory in full. Depends on `pyarrow`.
+"""
+__author__ = "Jens-Kristian Krogager"
+
+import re
+
+from astropy.io import fits
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from .fits_input import open_source, FormatError
+from .remote import read_table_columns
+
+
+# Target size in bytes of the raw table rows converted in one record batch:
+DEFAULT_CHUNK_BYTES = 64 * 1024**2
+
+# Unsigned integers are stored in FITS as signed integers with an offset given by TZERO:
+unsigned_zero_points = {'B': (-128, 'int8'), 'I': (2**15, 'uint16'),
+                        'J': (2**31, 'uint32'), 'K': (2**63, 'uint64')}
+
+
+def require_pyarrow():
+    """Raise an ImportError if `pyarrow` is not available"""
+    if pa is None:
+        raise ImportError("The Arrow export requires `pyarrow` to be installed")
+
+
+def FITS_to_arrow(code):
+    """Arrow type of a single element of the given FITS binary table format code"""
+    require_pyarrow()
+    arrow_types = {'L': pa.bool_(),
+                   'X': pa.bool_(),
+                   'B': pa.uint8(),
+                   'I': pa.int16(),
+                   'J': pa.int32(),
+                   'K': pa.int64(),
+                   'A': pa.string(),
+                   'E': pa.float32(),
+                   'D': pa.float64(),
+                   'C': pa.list_(pa.float32(), 2),
+                   'M': pa.list_(pa.float64(), 2),
+                   }
+    return arrow_types[code]
+
+
+def column_arrow_type(column):
+    """
+    Determine the Arrow type of a FITS binary table column.
+
+    Scaled columns (TSCAL/TZERO) are converted to float64, except for the integer
+    columns using TZERO to store unsigned values. Complex numbers are stored as
+    fixed-size lists of [real, imaginary]. Array columns become (nested) fixed-size
+    lists following the dimensions given by TDIM, and variable-length array
+    columns (P/Q formats) become variable-size lists.
+    """
+    require_pyarrow()
+    code = column.format.format
+    if code in 'PQ':
+        return pa.list_(FITS_to_arrow(column.format.p_format))
+
+    if column.bscale not in (None, 1) or column.bzero not in (None, 0):
+        zero_point, unsigned_type = unsigned_zero_points.get(code, (None, None))
+        if column.bscale in (None, 1) and column.bzero == zero_point:
+            arrow_type = pa.from_numpy_dtype(np.dtype(unsigned_type))
+        else:
+            arrow_type = pa.float64()
+    else:
+        arrow_type = FITS_to_arrow(code)
+
+    if column.dim:
+        shape = [int(num) for num in re.findall(r'\d+', column.dim)]
+    elif code == 'X' or column.format.repeat > 1:
+        shape = [column.format.repeat]
+    else:
+        shape = []
+    if code == 'A':
+        # The first dimension is the length of the strings:
+        shape = shape[1:]
+
+    # TDIM lists the fastest varying axis first, which is the innermost list:
+    for size in shape:
+        arrow_type = pa.list_(arrow_type, size)
+    return arrow_type
+
+
+def native_byteorder(array):
+    """Return the array in native byte order, only making a byteswapped copy if needed"""
+    if array.dtype.isnative:
+        return array
+    return array.astype(array.dtype.newbyteorder('='))
+
+
+def numpy_to_arrow(array, arrow_type):
+    """Convert a numpy array of the converted FITS column data to an Arrow array of the given type"""
+    if pa.types.is_fixed_size_list(arrow_type):
+        list_size = arrow_type.list_size
+        if array.dtype.kind == 'c' and pa.types.is_floating(arrow_type.value_type):
+            values = np.stack([array.real, array.imag], axis=-1).reshape(-1)
+        else:
+            values = array.reshape((len(array) * list_size,) + array.shape[2:])
+        return pa.FixedSizeListArray.from_arrays(numpy_to_arrow(values, arrow_type.value_type), list_size)
+
+    elif pa.types.is_list(arrow_type):
+        # Variable-length arrays are stored as an object array of numpy arrays:
+        values = [native_byteorder(np.asarray(item)) for item in array]
+        offsets = np.cumsum([0] + [len(item) for item in values])
+        if len(values) > 0:
+            flat = np.concatenate(values)
+        else:
+            flat = np.array([], dtype=arrow_type.value_type.to_pandas_dtype())
+        return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()),
+                                        numpy_to_arrow(flat, arrow_type.value_type))
+
+    elif pa.types.is_string(arrow_type):
+        if array.dtype.kind == 'S':
+            array = np.char.decode(array, 'ascii')
+        return pa.array(np.char.rstrip(array), type=arrow_type)
+
+    return pa.array(native_byteorder(array), type=arrow_type)
+
+
+def table_schema(columns, names=None):
+    """Arrow schema of the given FITS table columns (`fits.ColDefs`)"""
+    require_pyarrow()
+    if names is None:
+        names = columns.names
+    fields = list()
+    for name in names:
+        column = columns[name]
+        metadata = {key: str(val) for key, val in [('unit', column.unit), ('tform', column.format)] if val}
+        fields.append(pa.field(column.name, column_arrow_type(column), metadata=metadata))
+    return pa.schema(fields)
+
+
+def table_batch_reader(fname, ext=1, columns=None, chunk_size=None):
+    """
+    Stream a FITS binary table as Arrow record batches.
+
+    Parameters
+    ----------
+    fname : string or file-like
+        Filename, URL or `RangeReader` of the FITS file. Local files are memory-mapped
+        and remote files are read with range requests, one chunk at a time.
+        Remote tables with variable-length array columns (P/Q formats) are the
+        exception: their heap is not streamed, so the whole table is downloaded
+        and kept in memory.
+    ext : int or string  [default=1]
+        Extension number or name of the binary table.
+    columns : list of string
+        The names of the columns to export. By default all columns are exported.
+    chunk_size : int
+        Number of rows per record batch. By default, a number of rows
+        corresponding to about 64 MB of table data is used.
+
+    Returns
+    -------
+    reader : pyarrow.RecordBatchReader
+        Reader of record batches of at most `chunk_size` rows. The FITS file
+        is closed once all batches have been read.
+    """
+    require_pyarrow()
+    HDUlist, source = open_source(fname)
+    try:
+        hdu = HDUlist[ext]
+        if not isinstance(hdu, fits.BinTableHDU):
+            raise FormatError("Only binary tables can be exported, extension %r is a %s" % (ext, type(hdu).__name__))
+        names = hdu.columns.names if columns is None else [hdu.columns[name].name for name in columns]
+        schema = table_schema(hdu.columns, names)
+    except Exception:
+        HDUlist.close()
+        raise
+
+    n_rows = hdu.header['NAXIS2']
+    if chunk_size is None:
+        chunk_size = max(1, DEFAULT_CHUNK_BYTES // max(1, hdu.header['NAXIS1']))
+
+    def batches():
+        with HDUlist:
+            for start in range(0, n_rows, chunk_size):
+                tbdata = read_table_columns(hdu, source, names, rows=slice(start, start + chunk_size))
+                arrays = [numpy_to_arrow(tbdata.field(name), field.type) for name, field in zip(names, schema)]
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def spectrum_schema():
+    """Arrow schema of spectra exported by `spectrum_batch_reader`"""
+    require_pyarrow()
+    return pa.schema([pa.field('WAVE', pa.list_(pa.float64())),
+                      pa.field('FLUX', pa.list_(pa.float64())),
+                      pa.field('ERR', pa.list_(pa.float64())),
+                      pa.field('MASK', pa.list_(pa.bool_()))])
+
+
+def spectrum_batch_reader(spectra, chunk_size=100):
+    """
+    Convert loaded spectra to Arrow record batches with one row per spectrum.
+
+    Parameters
+    ----------
+    spectra : iterable
+        The output of `load_fits_spectrum` or `load_fits_explicit` for each file:
+        (wavelength, flux, err, mask, header). A generator can be used to load
+        the spectra as they are exported.
+    chunk_size : int  [default=100]
+        Number of spectra per record batch.
+
+    Returns
+    -------
+    reader : pyarrow.RecordBatchReader
+        Reader of record batches with the list columns: WAVE, FLUX, ERR and MASK.
+    """
+    require_pyarrow()
+    schema = spectrum_schema()
+
+    def batches():
+        chunk = list()
+        for spectrum in spectra:
+            chunk.append(spectrum[:4])
+            if len(chunk) == chunk_size:
+                yield spectra_to_batch(chunk, schema)
+                chunk = list()
+        if chunk:
+            yield spectra_to_batch(chunk, schema)
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def spectra_to_batch(chunk, schema):
+    """Convert a list of (wavelength, flux, err, mask) to a record batch"""
+    arrays = list()
+    for num, field in enumerate(schema):
+        value_type = field.type.value_type
+        values = [np.asarray(spectrum[num], dtype=value_type.to_pandas_dtype()).flatten() for spectrum in chunk]
+        offsets = np.cumsum([0] + [len(item) for item in values])
+        arrays.append(pa.ListArray.from_arrays(pa.array(offsets, pa.int32()),
+                                               pa.array(np.concatenate(values), type=value_type)))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_batches(reader, output, file_format=None):
+    """
+    Write record batches to an Arrow IPC file or a Parquet file.
+
+    Parameters
+    ----------
+    reader : pyarrow.RecordBatchReader
+        The record batches to write, e.g. from `table_batch_reader`.
+    output : string
+        Filename of the output file.
+    file_format : string {'ipc', 'parquet'}
+        The output format. By default, files ending in `.parquet` or `.pq`
+        are written as Parquet and all other files as Arrow IPC files.
+
+    Returns
+    -------
+    n_rows : int
+        The number of rows written.
+    """
+    require_pyarrow()
+    if file_format is None:
+        file_format = 'parquet' if output.lower().endswith(('.parquet', '.pq')) else 'ipc'
+
+    n_rows = 0
+    if file_format == 'parquet':
+        with pq.ParquetWriter(output, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                n_rows += batch.num_rows
+    elif file_format == 'ipc':
+        with pa.OSFile(output, 'wb') as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                n_rows += batch.num_rows
+    else:
+        raise ValueError("Unknown file format: %r. Must be 'ipc' or 'parquet'" % file_format)
+    return n_rows
+
+
+def table_to_arrow(fname, output, ext=1, columns=None, chunk_size=None, file_format=None):
+    """
+    Convert a FITS binary table to an Arrow IPC or Parquet file without loading it in full.
+    See `table_batch_reader` and `write_batches` for a description of the parameters.
+
+    Returns
+    -------
+    n_rows : int
+        The number of rows written.
+    """
+    reader = table_batch_reader(fname, ext, columns, chunk_size)
+    return write_batches(reader, output, file_format)
+
+
+def spectra_to_arrow(spectra, output, chunk_size=100, file_format=None):
+    """
+    Write loaded spectra to an Arrow IPC or Parquet file with one row per spectrum.
+    See `spectrum_batch_reader` and `write_batches` for a description of the parameters.
+
+    Returns
+    -------
+    n_rows : int
+        The number of spectra written.
+    """
+    reader = spectrum_batch_reader(spectra, chunk_size)
+    return write_batches(reader, output, file_format)
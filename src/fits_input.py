@@ -5,6 +5,12 @@ import warnings
 from astropy.io import fits
 import numpy as np
 
+try:
+    from .remote import RangeReader, is_url, read_table_columns
+except ImportError:
+    # Remote access is only available when used as part of the `fitsutil` package
+    RangeReader = None
+
 
 class MultipleSpectraWarning(Warning):
     """Throw warning when several FITS Table extensions or multiple IRAF objects are present"""
@@ -192,6 +198,33 @@ output_hdu_names = {'FLUX_HDU_NAMES': flux_HDU_names,
 get_spectrum_hdulist.__doc__ = get_spectrum_hdulist.__doc__ % output_hdu_names
 
 
+def open_source(fname):
+    """
+    Open a FITS file given as a filename, a URL or a file-like object.
+    URLs are read through a `RangeReader`, so only the required parts of the file are downloaded.
+
+    Returns
+    -------
+    HDUlist : fits.HDUList
+        The opened FITS file.
+    source : string or file-like
+        The file that was opened, needed by `get_table_data`.
+    """
+    if RangeReader is not None and is_url(fname):
+        fname = RangeReader(fname)
+    return fits.open(fname), fname
+
+
+def get_table_data(hdu, source, names=None):
+    """
+    Return the data of a FITS table. If the file is read from a `RangeReader`,
+    only the given columns are downloaded. See `open_source`.
+    """
+    if RangeReader is None:
+        return hdu.data
+    return read_table_columns(hdu, source, names)
+
+
 def load_fits_spectrum(fname, ext=None, iraf_obj=None):
     """
     Flexible inference of spectral data from FITS files.
@@ -200,8 +233,8 @@ def load_fits_spectrum(fname, ext=None, iraf_obj=None):
 
     Parameters
     ----------
-    fname : string
-        Filename for the FITS file to open
+    fname : string or file-like
+        Filename, URL or file-like object (e.g., a `RangeReader`) of the FITS file to open
     ext : int or string
         Extension number (int) or Extension Name (string)
     iraf_obj : int
@@ -221,7 +254,8 @@ def load_fits_spectrum(fname, ext=None, iraf_obj=None):
     header : fits.Header
         FITS Header of the data extension.
     """
-    with fits.open(fname) as HDUlist:
+    HDUlist, source = open_source(fname)
+    with HDUlist:
         primhdr = HDUlist[0].header
         primary_has_data = HDUlist[0].data is not None
         if primary_has_data:
@@ -278,12 +312,15 @@ def load_fits_spectrum(fname, ext=None, iraf_obj=None):
         else:
             is_fits_table = isinstance(HDUlist[1], fits.BinTableHDU) or isinstance(HDUlist[1], fits.TableHDU)
             if is_fits_table:
-                if ext:
-                    tbdata = HDUlist[ext].data
-                    data_hdr = HDUlist[ext].header
-                else:
-                    tbdata = HDUlist[1].data
-                    data_hdr = HDUlist[1].header
+                table_hdu = HDUlist[ext] if ext else HDUlist[1]
+                data_hdr = table_hdu.header
+                spectral_column_names = (wavelength_column_names + flux_column_names
+                                         + error_column_names + ['mask'])
+                names = [name for name in table_hdu.columns.names
+                         if name.lower() in spectral_column_names]
+                if len(names) == 0:
+                    raise FormatError("Could not find all data columns in the table")
+                tbdata = get_table_data(table_hdu, source, names)
 
                 has_multi_extensions = len(HDUlist) > 2
                 if has_multi_extensions and (ext is None):
@@ -345,7 +382,22 @@ def identify_column_names(tbdata):
 
     return column_name_guess
 
-def load_fits_explicit(filename, specs, mask_type='inclusion'):
+def flatten_spectrum_arrays(wavelength, flux, err, mask):
+    """Flatten data arrays of shape (1, N) to shape (N,). Other 2D shapes raise a FormatError"""
+    if len(flux.shape) > 1:
+        is_collumn_array = (len(flux.shape) == 2) and (flux.shape[0] == 1)
+        if is_collumn_array:
+            # Data has shape (1, N). Flatten the array to create shape (N,)
+            wavelength = wavelength.flatten()
+            flux = flux.flatten()
+            err = err.flatten()
+            mask = mask.flatten()
+        else:
+            raise FormatError("Incorrect Data Shape: {}".format(flux.shape))
+    return wavelength, flux, err, mask
+
+
+def load_fits_explicit(filename, specs, mask_type='inclusion', template=None):
     """
     Load data from a FITS file with an explicitly given extension/column specification.
     This function does not support IRAF format. Instead, use `load_fits_spectrum()`
@@ -353,8 +405,8 @@ def load_fits_explicit(filename, specs, mask_type='inclusion'):
 
     Parameters
     ----------
-    filename : string
-        Filename of the FITS file to read from.
+    filename : string or file-like
+        Filename, URL or file-like object (e.g., a `RangeReader`) of the FITS file to read from.
 
     specs : dict
         Dictionary containing the column and extension specifications for the data arrays.
@@ -368,6 +420,11 @@ def load_fits_explicit(filename, specs, mask_type='inclusion'):
         pixels that should be excluded.
         The default is to parse an `inclusion` mask.
 
+    template : dict  [default=None]
+        Layout template created by `get_layout_template()` from a file with the same structure
+        and the same `specs`. If given, the data arrays are read directly from their known byte
+        offsets. Files that do not match the template are loaded in the normal way.
+
     Returns
     -------
     wavelength, flux, err : np.array(float)
@@ -381,9 +438,19 @@ def load_fits_explicit(filename, specs, mask_type='inclusion'):
         if key not in specs.keys():
             raise FormatError("Mandatory Column or Extension missing: %s" % key)
 
-    with fits.open(filename) as HDUList:
-        data_ext = HDUList[specs['EXT_NUM']].data
-        if isinstance(data_ext, fits.FITS_rec):
+    if template is not None:
+        if template['specs'] != specs:
+            raise ValueError("The layout template was created with different `specs`")
+        template_data = load_fits_template(filename, template, mask_type)
+        if template_data is not None:
+            return template_data
+
+    HDUList, source = open_source(filename)
+    with HDUList:
+        data_hdu = HDUList[specs['EXT_NUM']]
+        if isinstance(data_hdu, (fits.BinTableHDU, fits.TableHDU)):
+            names = [specs[key] for key in ['WAVE', 'FLUX', 'ERR', 'MASK'] if key in specs.keys()]
+            data_ext = get_table_data(data_hdu, source, names)
             wavelength = data_ext[specs['WAVE']]
             flux = data_ext[specs['FLUX']]
             err = data_ext[specs['ERR']]
@@ -424,15 +491,215 @@ def load_fits_explicit(filename, specs, mask_type='inclusion'):
             else:
                 mask = np.ones(len(flux), dtype=bool)
 
-        if len(flux.shape) > 1:
-            is_collumn_array = (len(flux.shape) == 2) and (flux.shape[0] == 1)
-            if is_collumn_array:
-                # Data has shape (1, N). Flatten the array to create shape (N,)
-                wavelength = wavelength.flatten()
-                flux = flux.flatten()
-                err = err.flatten()
-                mask = mask.flatten()
+        wavelength, flux, err, mask = flatten_spectrum_arrays(wavelength, flux, err, mask)
+        return wavelength, flux, err, mask, header
+
+
+# -- Data types of the FITS column formats and image BITPIX values that can be read directly:
+template_column_dtypes = {'L': 'i1', 'B': 'u1', 'I': '>i2', 'J': '>i4', 'K': '>i8', 'E': '>f4', 'D': '>f8'}
+template_image_dtypes = {8: 'u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+
+def get_layout_keywords(hdr):
+    """Return the header keywords that determine the size and data layout of an HDU"""
+    keywords = ['SIMPLE', 'XTENSION', 'BITPIX', 'NAXIS', 'PCOUNT', 'GCOUNT', 'GROUPS',
+                'EXTNAME', 'BSCALE', 'BZERO', 'TFIELDS']
+    keywords += ['NAXIS%i' % num for num in range(1, hdr['NAXIS'] + 1)]
+    for num in range(1, hdr.get('TFIELDS', 0) + 1):
+        keywords += ['%s%i' % (key, num) for key in ['TTYPE', 'TFORM', 'TDIM', 'TSCAL', 'TZERO']]
+    return keywords
+
+
+def read_layout_cards(fileobj, hdr_loc, dat_loc, keywords):
+    """
+    Read the header located between the byte offsets `hdr_loc` and `dat_loc`
+    and return the values of the given `keywords` (`None` if not present).
+    Only the cards of the requested keywords are parsed.
+
+    Returns
+    -------
+    cards : dict or None
+        Values of the layout keywords, or `None` if the header does not end
+        in the last 2880 byte block before `dat_loc`.
+    raw_header : bytes
+        The raw header string.
+    """
+    fileobj.seek(hdr_loc)
+    raw_header = fileobj.read(dat_loc - hdr_loc)
+    if len(raw_header) != dat_loc - hdr_loc:
+        return None, raw_header
+
+    cards = dict.fromkeys(keywords)
+    keywords = set(kw.encode('ascii') for kw in keywords)
+    for pos in range(0, len(raw_header), 80):
+        keyword = raw_header[pos:pos+8].rstrip()
+        if keyword == b'END':
+            if pos < len(raw_header) - 2880:
+                # The header is shorter than in the template
+                return None, raw_header
+            return cards, raw_header
+        if keyword in keywords:
+            card = fits.Card.fromstring(raw_header[pos:pos+80].decode('ascii'))
+            cards[card.keyword] = card.value
+    # No END card: the header is longer than in the template
+    return None, raw_header
+
+
+def get_layout_template(filename, specs):
+    """
+    Learn the data layout of a FITS file for use with `load_fits_explicit()`.
+    All files loaded with the template must have the same HDU structure, header sizes,
+    column formats and array dimensions as `filename`. The keywords determining this
+    layout are stored in the template and checked for every file.
+
+    Only tables with columns of format %(COL_FORMATS)r and images without scaling
+    (BSCALE/BZERO) can be read directly.
+
+    Parameters
+    ----------
+    filename : string
+        Filename of the FITS file used as template.
+    specs : dict
+        Column and extension specifications, see `load_fits_explicit()`.
+
+    Returns
+    -------
+    template : dict or None
+        The layout template, or `None` if the data cannot be read directly.
+    """
+    with fits.open(filename) as HDUList:
+        data_hdu = HDUList[specs['EXT_NUM']]
+        arrays = dict()
+        if isinstance(data_hdu, fits.BinTableHDU):
+            header_ext = HDUList.index_of(specs['EXT_NUM'])
+            extensions = [header_ext]
+            raw_dtype = data_hdu.data.dtype
+            for key in ['WAVE', 'FLUX', 'ERR', 'MASK']:
+                if key not in specs.keys():
+                    continue
+                column = data_hdu.columns[specs[key]]
+                base_format = column.format[-1]
+                no_scaling = column.bscale is None and column.bzero is None
+                if base_format not in template_column_dtypes or not no_scaling:
+                    return None
+                field_dtype, field_offset = raw_dtype.fields[column.name][:2]
+                row_dtype = np.dtype({'names': ['field'], 'formats': [field_dtype],
+                                      'offsets': [field_offset], 'itemsize': raw_dtype.itemsize})
+                arrays[key] = (header_ext, row_dtype, (len(data_hdu.data),), base_format == 'L')
+
+        elif isinstance(data_hdu, fits.TableHDU):
+            return None
+
+        else:
+            extensions = list()
+            for key in ['FLUX', 'ERR', 'MASK']:
+                if key not in specs.keys():
+                    continue
+                try:
+                    ext = int(specs[key])
+                except ValueError:
+                    ext = specs[key]
+                hdu = HDUList[ext]
+                no_scaling = hdu.header.get('BSCALE', 1) == 1 and hdu.header.get('BZERO', 0) == 0
+                if hdu.header['BITPIX'] not in template_image_dtypes or not no_scaling:
+                    return None
+                dtype = np.dtype(template_image_dtypes[hdu.header['BITPIX']])
+                shape = tuple(hdu.header['NAXIS%i' % num] for num in range(hdu.header['NAXIS'], 0, -1))
+                arrays[key] = (HDUList.index_of(ext), dtype, shape, False)
+                extensions.append(HDUList.index_of(ext))
+            header_ext = extensions[0]
+
+        # Store the layout of all HDUs up to the last one needed, since they all determine the data offsets:
+        headers = list()
+        for hdu in HDUList[:max(extensions) + 1]:
+            info = hdu.fileinfo()
+            keywords = get_layout_keywords(hdu.header)
+            cards = {key: hdu.header.get(key) for key in keywords}
+            headers.append((info['hdrLoc'], info['datLoc'], cards))
+
+    template = {'specs': dict(specs), 'headers': headers, 'header_ext': header_ext, 'arrays': arrays,
+                'is_table': isinstance(data_hdu, fits.BinTableHDU)}
+    return template
+
+# Hack the doc-string of the function to input the column formats:
+get_layout_template.__doc__ = get_layout_template.__doc__ % {'COL_FORMATS': ''.join(template_column_dtypes)}
+
+
+def load_fits_template(filename, template, mask_type='inclusion'):
+    """
+    Load data arrays directly from their byte offsets given in a layout template.
+    Use `load_fits_explicit()` with the `template` keyword rather than calling this directly.
+
+    Returns
+    -------
+    wavelength, flux, err, mask, header
+        As returned by `load_fits_explicit()`, or `None` if the file
+        does not match the template.
+    """
+    try:
+        with open(filename, 'rb') as fileobj:
+            for num, (hdr_loc, dat_loc, template_cards) in enumerate(template['headers']):
+                cards, raw_header = read_layout_cards(fileobj, hdr_loc, dat_loc, template_cards.keys())
+                if cards != template_cards:
+                    return None
+                if num == template['header_ext']:
+                    header = fits.Header.fromstring(raw_header)
+
+        file_data = np.memmap(filename, dtype=np.uint8, mode='r')
+        data = dict()
+        for key, (ext, dtype, shape, is_bool) in template['arrays'].items():
+            offset = template['headers'][ext][1]
+            array = np.ndarray(shape, dtype=dtype, buffer=file_data, offset=offset)
+            if template['is_table']:
+                array = array['field']
+            if is_bool:
+                data[key] = array == ord('T')
             else:
-                raise FormatError("Incorrect Data Shape: {}".format(flux.shape))
+                data[key] = array.astype(array.dtype.newbyteorder('='))
+        del file_data
+    except (OSError, TypeError, ValueError):
+        # The file is missing, not a local file or too short for the template:
+        return None
+
+    flux = data['FLUX']
+    err = data['ERR']
+    if template['is_table']:
+        wavelength = data['WAVE']
+        if 'MASK' in data:
+            mask = data['MASK'].astype(bool)
+            if mask_type.lower() in 'exclusion':
+                mask = ~mask
+        else:
+            mask = np.ones(len(flux), dtype=bool)
+    else:
+        wavelength = get_wavelength_from_header(header)
+        if 'MASK' in data:
+            mask = data['MASK']
+            if mask_type.lower() in 'exclusion':
+                mask = ~mask
+        else:
+            mask = np.ones(len(flux), dtype=bool)
 
-        return wavelength, flux, err, mask, header
+    wavelength, flux, err, mask = flatten_spectrum_arrays(wavelength, flux, err, mask)
+    return wavelength, flux, err, mask, header
+
+
+def load_fits_explicit_batch(filenames, specs, mask_type='inclusion'):
+    """
+    Load a list of FITS files with identical structure using `load_fits_explicit()`.
+    The data layout is learned from the first file (see `get_layout_template()`),
+    and the following files are read directly from the known byte offsets.
+    Files that do not match the layout are loaded in the normal way.
+
+    Returns
+    -------
+    spectra : list
+        List of `(wavelength, flux, err, mask, header)` for each file.
+    """
+    spectra = list()
+    template = None
+    for num, filename in enumerate(filenames):
+        if num == 0:
+            template = get_layout_template(filename, specs)
+        spectra.append(load_fits_explicit(filename, specs, mask_type, template=template))
+    return spectra
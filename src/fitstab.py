@@ -8,6 +8,12 @@ import numpy as np
 import subprocess
 import shlex
 
+try:
+    from .remote import RangeReader, is_url, read_table_columns
+except ImportError:
+    # Running as a script from the `src` directory:
+    from remote import RangeReader, is_url, read_table_columns
+
 
 FITS_to_string = {'L': 'bool',
                   'X': 'bit',
@@ -161,14 +167,23 @@ def show_table(fname, ext=1, num=10):
     """
     Show the top `num` rows of a FITS table using Astropy
     Default is to show top 10 lines.
+    The table can also be given as a URL, in which case only the header
+    and the first `num` rows are downloaded.
     """
-    if not os.path.exists(fname):
+    remote_file = is_url(fname)
+    if not remote_file and not os.path.exists(fname):
         print(f" [ERROR] - File not found: {fname}")
         return -1
 
-    fits_table = fits.getdata(fname, ext, memmap=True)
+    if remote_file:
+        source = RangeReader(fname)
+        with fits.open(source) as HDUlist:
+            N_rows = HDUlist[ext].header['NAXIS2']
+            fits_table = read_table_columns(HDUlist[ext], source, rows=slice(0, num))
+    else:
+        fits_table = fits.getdata(fname, ext, memmap=True)
+        N_rows = len(fits_table)
     table = Table(fits_table[:num])
-    N_rows = len(fits_table)
 
     str_repr = table[:num].__repr__()
     all_lines = str_repr.split('\n')
@@ -185,6 +200,8 @@ def show_table(fname, ext=1, num=10):
         print(bottom_line)
         print("")
     print("  Table Length: %i rows\n" % N_rows)
+    if remote_file:
+        print("  Transferred: %i bytes in %i requests\n" % (source.bytes_transferred, source.n_requests))
 
 
 if __name__ == '__main__':
@@ -192,7 +209,7 @@ if __name__ == '__main__':
     description = """Preview a FITS table from terminal and display the column definitions"""
     parser = ArgumentParser(description=description)
     parser.add_argument("input", type=str,
-                        help="FITS Table file")
+                        help="FITS Table file or URL")
     parser.add_argument("--ext", "-e", type=int, default=1,
                         help="Give the number of the extension [see `fitsinfo`]")
     parser.add_argument("--num", "-n", type=int, default=10,
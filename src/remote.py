@@ -0,0 +1,456 @@
+# jkrogager/fitsutil/src/remote.py
+"""
+Read FITS files over HTTP using byte-range requests.
+
+A `RangeReader` is a read-only, seekable file-like object that can be passed
+directly to `astropy.io.fits.open`. Only the blocks of the file which are
+actually read are downloaded: astropy reads the headers and seeks past the
+data units, so the data of an HDU is only fetched once it is accessed.
+Image sections (`hdu.section[i:j]`) likewise only fetch the requested pixels,
+and `read_table_columns` fetches only the requested columns and rows of a table.
+"""
+__author__ = "Jens-Kristian Krogager"
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import io
+import re
+import threading
+from urllib.parse import urlsplit
+
+from astropy.io import fits
+import numpy as np
+
+
+# Blocks are aligned to the 2880 byte FITS records, so that a typical header
+# is retrieved in a single request:
+DEFAULT_BLOCK_SIZE = 32 * 2880
+
+content_range_pattern = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+class RemoteError(Exception):
+    """Raised when the server does not return the requested byte range or does not support range requests"""
+    pass
+
+
+def is_url(fname):
+    """Return `True` if the input is an HTTP(S) URL"""
+    return isinstance(fname, str) and fname.lower().startswith(('http://', 'https://'))
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP connections shared between several `RangeReader` instances.
+    The pool is thread-safe and keeps a tally of all data transferred through it.
+
+    Parameters
+    ----------
+    timeout : float  [default=30]
+        Socket timeout in seconds for new connections.
+    max_idle : int  [default=8]
+        Maximum number of idle connections to keep open per host.
+    """
+    def __init__(self, timeout=30., max_idle=8):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.bytes_transferred = 0
+        self.n_requests = 0
+        self.n_connections = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme, netloc):
+        """Return an idle connection to the host or open a new one"""
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+            self.n_connections += 1
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def release(self, scheme, netloc, conn):
+        """Return a connection to the pool so it can be reused"""
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def record(self, nbytes):
+        """Add a completed request of `nbytes` to the transfer statistics"""
+        with self._lock:
+            self.bytes_transferred += nbytes
+            self.n_requests += 1
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle = {}
+
+
+default_pool = ConnectionPool()
+
+
+def coalesce_blocks(block_ids, max_gap=0, max_blocks=None):
+    """
+    Group sorted block indices into runs of consecutive blocks that can be
+    fetched in a single request. Runs separated by at most `max_gap` blocks
+    are merged. If given, no run is longer than `max_blocks`.
+
+    Returns
+    -------
+    runs : list of (int, int)
+        Index of the first and last block (inclusive) of each run.
+    """
+    runs = list()
+    for idx in block_ids:
+        if runs:
+            first, last = runs[-1]
+            fits_in_run = max_blocks is None or idx - first < max_blocks
+            if idx - last <= max_gap + 1 and fits_in_run:
+                runs[-1] = (first, idx)
+                continue
+        runs.append((idx, idx))
+    return runs
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Read-only file-like access to a file served over HTTP(S) using range requests.
+
+    The file is retrieved in blocks of `block_size` bytes which are kept in an
+    LRU cache. Adjacent missing blocks are requested together, and the
+    connections are reused through a `ConnectionPool`.
+
+    Parameters
+    ----------
+    url : string
+        The URL of the file. The server must support `Range` requests.
+    block_size : int  [default=92160]
+        Size in bytes of the blocks fetched from the server.
+    cache_blocks : int  [default=256]
+        Maximum number of blocks to keep in the cache.
+    max_gap : int  [default=1]
+        Missing blocks separated by at most this many blocks are fetched
+        in the same request.
+    max_request_blocks : int  [default=1024]
+        Maximum number of blocks to request at once.
+    pool : ConnectionPool
+        Connection pool to use. By default a module-wide pool is used.
+
+    Attributes
+    ----------
+    bytes_transferred : int
+        Number of payload bytes downloaded by this reader.
+    n_requests : int
+        Number of HTTP requests issued by this reader.
+    """
+    def __init__(self, url, block_size=DEFAULT_BLOCK_SIZE, cache_blocks=256, max_gap=1,
+                 max_request_blocks=1024, pool=None):
+        super().__init__()
+        parts = urlsplit(url)
+        if parts.scheme.lower() not in ('http', 'https'):
+            raise ValueError("Only HTTP(S) URLs are supported: %s" % url)
+        self.url = url
+        self.name = url
+        self.mode = 'rb'
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.max_gap = max_gap
+        self.max_request_blocks = max_request_blocks
+        self.pool = default_pool if pool is None else pool
+        self.bytes_transferred = 0
+        self.n_requests = 0
+
+        self._scheme = parts.scheme.lower()
+        self._netloc = parts.netloc
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path += '?' + parts.query
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._size = None
+        self._pos = 0
+
+    def __repr__(self):
+        return "<RangeReader %s>" % self.url
+
+    @property
+    def size(self):
+        """Total size of the remote file in bytes"""
+        if self._size is None:
+            self.fetch_blocks([0])
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("Invalid value for `whence`: %r" % whence)
+        if pos < 0:
+            raise ValueError("Negative seek position: %i" % pos)
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        start = self._pos
+        stop = min(start + len(view), self.size)
+        if stop <= start:
+            return 0
+
+        first, last = start // self.block_size, (stop - 1) // self.block_size
+        blocks = self.fetch_blocks(range(first, last + 1))
+        nbytes = 0
+        for idx in range(first, last + 1):
+            block_start = idx * self.block_size
+            lo = max(start, block_start) - block_start
+            hi = min(stop, block_start + len(blocks[idx])) - block_start
+            view[nbytes:nbytes + hi - lo] = blocks[idx][lo:hi]
+            nbytes += hi - lo
+        self._pos += nbytes
+        return nbytes
+
+    def close(self):
+        self._cache.clear()
+        super().close()
+
+    def fetch_blocks(self, block_ids):
+        """
+        Return the given blocks, downloading the ones that are not cached.
+
+        Returns
+        -------
+        blocks : dict
+            Block contents as `bytes` keyed by block index. The last block
+            of the file may be shorter than `block_size`.
+        """
+        block_ids = set(block_ids)
+        with self._lock:
+            blocks = dict()
+            missing = list()
+            for idx in sorted(block_ids):
+                if idx in self._cache:
+                    self._cache.move_to_end(idx)
+                    blocks[idx] = self._cache[idx]
+                else:
+                    missing.append(idx)
+
+            if self._size is not None:
+                n_blocks = -(-self._size // self.block_size)
+                missing = [idx for idx in missing if idx < n_blocks]
+
+            for first, last in coalesce_blocks(missing, self.max_gap, self.max_request_blocks):
+                start = first * self.block_size
+                stop = (last + 1) * self.block_size
+                if self._size is not None:
+                    stop = min(stop, self._size)
+                if stop <= start:
+                    continue
+                data = self._request(start, stop)
+                for idx in range(first, last + 1):
+                    offset = (idx - first) * self.block_size
+                    block = data[offset:offset + self.block_size]
+                    if not block:
+                        break
+                    self._store(idx, block)
+                    if idx in block_ids:
+                        blocks[idx] = block
+            return blocks
+
+    def _store(self, idx, block):
+        self._cache[idx] = block
+        self._cache.move_to_end(idx)
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+
+    def _request(self, start, stop):
+        """Download the bytes [start, stop) of the file"""
+        headers = {'Range': 'bytes=%i-%i' % (start, stop - 1)}
+        # A kept-alive connection may have been closed by the server in the meantime,
+        # in which case the request is retried once on a new connection:
+        for attempt in range(2):
+            conn = self.pool.acquire(self._scheme, self._netloc)
+            try:
+                conn.request('GET', self._path, headers=headers)
+                response = conn.getresponse()
+                if response.status == 200:
+                    # The server ignores the Range header and would send the whole file:
+                    conn.close()
+                    raise RemoteError("The server does not support range requests: %s" % self.url)
+                body = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if attempt > 0:
+                    raise
+                continue
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(self._scheme, self._netloc, conn)
+        self.pool.record(len(body))
+        self.bytes_transferred += len(body)
+        self.n_requests += 1
+
+        if response.status == 206:
+            match = content_range_pattern.match(response.getheader('Content-Range', ''))
+            if match and match.group(3) != '*':
+                self._size = int(match.group(3))
+            return body
+        elif response.status == 416:
+            # The range starts beyond the end of the file:
+            match = re.match(r'bytes\s+\*/(\d+)', response.getheader('Content-Range', ''))
+            if match:
+                self._size = int(match.group(1))
+            return b''
+        raise RemoteError("HTTP error %i (%s) for %s" % (response.status, response.reason, self.url))
+
+
+def read_table_columns(hdu, source, names=None, rows=None):
+    """
+    Read a subset of columns and rows of a FITS table.
+
+    If `source` is the `RangeReader` the HDU was opened from, only the blocks
+    holding the requested cells are downloaded. Otherwise, or if the table
+    has a heap (variable-length array columns), the full table data are read:
+    for remote tables with a heap this downloads the whole table.
+
+    Parameters
+    ----------
+    hdu : fits.BinTableHDU or fits.TableHDU
+        The table HDU whose data have not yet been accessed.
+    source : RangeReader, string or file-like
+        The file the HDU was opened from.
+    names : list of string
+        The columns to read. By default all columns are read.
+    rows : slice
+        Contiguous range of rows to read. By default all rows are read.
+
+    Returns
+    -------
+    tbdata : fits.FITS_rec
+        The table data. For remote tables only the requested columns are included,
+        otherwise all columns of the table are returned.
+    """
+    if rows is None:
+        rows = slice(None)
+    has_heap = hdu.header.get('PCOUNT', 0) > 0
+    if not isinstance(source, RangeReader) or not isinstance(hdu, fits.BinTableHDU) or has_heap:
+        return hdu.data[rows]
+
+    start_row, stop_row, step = rows.indices(hdu.header['NAXIS2'])
+    if step != 1:
+        raise ValueError("Only contiguous row ranges are supported")
+    n_rows = max(stop_row - start_row, 0)
+
+    column_names = {name.lower(): name for name in hdu.columns.names}
+    if names is None:
+        names = hdu.columns.names
+    names = [column_names[name.lower()] for name in names]
+
+    # Find the blocks holding the requested cells of each row:
+    row_stride = hdu.header['NAXIS1']
+    span_start = hdu.fileinfo()['datLoc'] + start_row * row_stride
+    span_stop = span_start + n_rows * row_stride
+    row_offsets = span_start + np.arange(n_rows, dtype=np.int64) * row_stride
+    block_size = source.block_size
+    block_ids = set()
+    for name in names:
+        col_dtype, col_offset = hdu.columns.dtype.fields[name][:2]
+        first = (row_offsets + col_offset) // block_size
+        last = (row_offsets + col_offset + col_dtype.itemsize - 1) // block_size
+        for k in range(int(np.max(last - first, initial=0)) + 1):
+            block_ids.update(np.minimum(first + k, last).tolist())
+    blocks = source.fetch_blocks(block_ids)
+
+    # Assemble the rows of the requested part of the table, bytes that were not downloaded are left as zeros:
+    rows_buffer = np.zeros(n_rows * row_stride, dtype=np.uint8)
+    for idx, block in blocks.items():
+        block_start = idx * block_size
+        lo = max(span_start, block_start)
+        hi = min(span_stop, block_start + len(block))
+        if hi > lo:
+            rows_buffer[lo - span_start:hi - span_start] = np.frombuffer(block, dtype=np.uint8)[lo - block_start:hi - block_start]
+
+    # Pack only the requested columns into a new table, so the zero-filled cells are left out
+    # and astropy converts the raw column data exactly as for the original table:
+    rows_buffer = rows_buffer.reshape(n_rows, row_stride)
+    cells = list()
+    for name in names:
+        col_dtype, col_offset = hdu.columns.dtype.fields[name][:2]
+        cells.append(rows_buffer[:, col_offset:col_offset + col_dtype.itemsize])
+    packed = np.concatenate(cells, axis=1).tobytes() if n_rows > 0 else b''
+    packed += b'\0' * (-len(packed) % 2880)
+
+    header = subset_table_header(hdu.columns, names)
+    header['NAXIS2'] = n_rows
+    # Unsigned integer columns are converted as by `fits.open`, which uses `uint=True` by default:
+    subset = fits.BinTableHDU.fromstring(header.tostring().encode('ascii') + packed, uint=True)
+    return subset.data
+
+
+def subset_table_header(columns, names):
+    """Header of a binary table containing only the given columns, without accessing their data"""
+    subset_columns = list()
+    for name in names:
+        column = columns[name]
+        subset_columns.append(fits.Column(name=column.name, format=column.format, unit=column.unit,
+                                          null=column.null, bscale=column.bscale, bzero=column.bzero,
+                                          disp=column.disp, dim=column.dim))
+    return fits.BinTableHDU.from_columns(subset_columns, nrows=0).header
+
+
+def load_remote_batch(loader, sources, max_workers=4, pool=None, **kwargs):
+    """
+    Apply a loader such as `load_fits_spectrum` to a list of files concurrently.
+    URLs are opened as `RangeReader` instances sharing the connections of `pool`,
+    whose attributes `bytes_transferred` and `n_requests` report the total transfer.
+
+    Parameters
+    ----------
+    loader : callable
+        Function taking a filename or file-like object as first argument.
+    sources : list
+        Filenames, URLs or file-like objects to load.
+    max_workers : int  [default=4]
+        Number of files to load at the same time.
+    pool : ConnectionPool
+        Connection pool to use. By default a module-wide pool is used.
+    **kwargs
+        Additional keywords passed to `loader`.
+
+    Returns
+    -------
+    results : list
+        The output of `loader` for each file, in the order of `sources`.
+    """
+    def load(source):
+        if is_url(source):
+            source = RangeReader(source, pool=pool)
+        return loader(source, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load, sources))
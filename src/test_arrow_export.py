@@ -0,0 +1,79 @@
+from astropy.io import fits
+import numpy as np
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from .arrow_export import table_batch_reader, table_to_arrow, spectra_to_arrow
+from .test_remote import serve_directory
+
+
+def make_table(fname, n_rows=1000, variable_length=True):
+    columns = [fits.Column(name='ID', format='K', array=np.arange(n_rows)),
+               fits.Column(name='UINT', format='I', bzero=32768, array=np.arange(n_rows, dtype='u2')),
+               fits.Column(name='NAME', format='8A', array=['row%i' % i for i in range(n_rows)]),
+               fits.Column(name='FLAG', format='L', array=np.arange(n_rows) % 2 == 0),
+               fits.Column(name='BIT', format='1X', array=(np.arange(n_rows) % 3 == 0).reshape(n_rows, 1)),
+               fits.Column(name='ULONG', format='K', bzero=2**63,
+                           array=2**64 - 1 - np.arange(n_rows, dtype='u8')),
+               fits.Column(name='IMG', format='6E', dim='(3,2)', array=np.ones((n_rows, 2, 3))),
+               fits.Column(name='Z', format='C', array=np.arange(n_rows) + 1j),
+               fits.Column(name='VAR', format='PE()', array=[np.ones(i % 4) for i in range(n_rows)])]
+    if not variable_length:
+        columns = columns[:-1]
+    fits.BinTableHDU.from_columns(columns).writeto(fname)
+
+
+def test_table_batches(tmp_path):
+    """Test that a FITS table is streamed in chunks with the correct Arrow types"""
+    fname = str(tmp_path / 'table.fits')
+    make_table(fname)
+    reader = table_batch_reader(fname, chunk_size=300)
+    assert reader.schema.field('UINT').type == pa.uint16()
+    assert reader.schema.field('IMG').type == pa.list_(pa.list_(pa.float32(), 3), 2)
+    assert reader.schema.field('Z').type == pa.list_(pa.float32(), 2)
+    assert reader.schema.field('VAR').type == pa.list_(pa.float32())
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [300, 300, 300, 100]
+
+    table = pa.Table.from_batches(batches)
+    tbdata = fits.getdata(fname)
+    assert table['ID'].to_pylist() == list(tbdata['ID'])
+    assert table['UINT'].to_pylist() == list(tbdata['UINT'])
+    assert table['NAME'].to_pylist() == list(tbdata['NAME'])
+    assert table['FLAG'].to_pylist() == list(tbdata['FLAG'])
+    assert np.all(np.array(table['IMG'].to_pylist()) == tbdata['IMG'])
+    assert table['Z'][2].as_py() == [2., 1.]
+    assert table['VAR'][3].as_py() == [1., 1., 1.]
+
+
+def test_export_files(tmp_path):
+    """Test writing a column selection to Parquet and loaded spectra to an Arrow IPC file"""
+    fname = str(tmp_path / 'table.fits')
+    make_table(fname)
+    n_rows = table_to_arrow(fname, str(tmp_path / 'table.parquet'), columns=['id', 'flag'], chunk_size=128)
+    assert n_rows == 1000
+    assert pq.read_table(str(tmp_path / 'table.parquet')).column_names == ['ID', 'FLAG']
+
+    spectra = ((np.arange(10.), np.ones(10, dtype='>f4'), np.ones(10), np.ones(10, dtype=bool), None)
+               for _ in range(7))
+    assert spectra_to_arrow(spectra, str(tmp_path / 'spectra.arrow'), chunk_size=3) == 7
+    table = pa.ipc.open_file(str(tmp_path / 'spectra.arrow')).read_all()
+    assert table.num_rows == 7
+    assert table['WAVE'][0].as_py() == list(np.arange(10.))
+
+
+def test_remote_table_batches(tmp_path):
+    """Test that exporting a remote table gives the same result as the local export"""
+    # Tables without a heap are read in chunks of rows, tables with a heap are downloaded in full:
+    for variable_length in [False, True]:
+        fname = tmp_path / ('table_%s.fits' % variable_length)
+        make_table(str(fname), variable_length=variable_length)
+        local = table_batch_reader(str(fname), chunk_size=300).read_all()
+        with serve_directory(tmp_path) as url:
+            remote = table_batch_reader(url + '/' + fname.name, chunk_size=300).read_all()
+        assert remote.schema == local.schema
+        assert remote.equals(local)
+        assert remote['ULONG'][0].as_py() == 2**64 - 1
+        assert remote['BIT'][0].as_py() == [True]
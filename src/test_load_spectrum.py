@@ -1,4 +1,8 @@
+from astropy.io import fits
+import numpy as np
+
 from .fits_input import load_fits_spectrum, FormatError, WavelengthError, load_fits_explicit
+from .fits_input import get_layout_template, load_fits_template, load_fits_explicit_batch
 
 
 def test_fileinput():
@@ -51,6 +55,32 @@ def test_explicit_load():
     assert all(passed)
 
 
+def test_template_load(tmp_path):
+    """Test that loading with a layout template gives the same result as the full load"""
+    filelist = list()
+    for num, npix in enumerate([1000, 1000, 1000, 500]):
+        columns = [fits.Column(name='WAVE', format='%iD' % npix, array=[np.linspace(3000., 9000., npix)]),
+                   fits.Column(name='FLUX', format='%iE' % npix, array=[num*np.ones(npix)]),
+                   fits.Column(name='ERR', format='%iE' % npix, array=[np.ones(npix)]),
+                   fits.Column(name='QUAL', format='%iL' % npix, array=[np.arange(npix) % 3 == 0])]
+        fname = str(tmp_path / ('spec%i.fits' % num))
+        fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns(columns)]).writeto(fname)
+        filelist.append(fname)
+
+    specs = {'EXT_NUM': 1, 'WAVE': 'WAVE', 'FLUX': 'FLUX', 'ERR': 'ERR', 'MASK': 'QUAL'}
+    template = get_layout_template(filelist[0], specs)
+    assert load_fits_template(filelist[1], template) is not None
+    # The last file has a different layout:
+    assert load_fits_template(filelist[3], template) is None
+
+    spectra = load_fits_explicit_batch(filelist, specs, 'exclusion')
+    for fname, spectrum in zip(filelist, spectra):
+        expected = load_fits_explicit(fname, specs, 'exclusion')
+        for array, expected_array in zip(spectrum[:4], expected[:4]):
+            assert np.all(array == expected_array)
+        assert spectrum[4] == expected[4]
+
+
 tmp_var = ["str", "str2", "name"]
 tmp_var2 = ["strf", "rupaul", "name"]
 def skip_warning():
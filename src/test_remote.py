@@ -0,0 +1,180 @@
+import contextlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import io
+import re
+import threading
+
+from astropy.io import fits
+import numpy as np
+import pytest
+
+from .fits_input import load_fits_spectrum, load_fits_explicit
+from .fitstab import show_table
+from .remote import RangeReader, ConnectionPool, RemoteError, read_table_columns, load_remote_batch
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serve files from a directory with support for keep-alive and single byte-range requests"""
+    protocol_version = 'HTTP/1.1'
+
+    def send_head(self):
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match is None:
+            return super().send_head()
+
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        start, stop = int(match.group(1)), min(int(match.group(2)), len(content) - 1)
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/fits')
+        self.send_header('Content-Range', 'bytes %i-%i/%i' % (start, stop, len(content)))
+        self.send_header('Content-Length', str(stop - start + 1))
+        self.end_headers()
+        return io.BytesIO(content[start:stop + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class NoRangeRequestHandler(RangeRequestHandler):
+    """Serve whole files only, ignoring the Range header"""
+    def send_head(self):
+        return SimpleHTTPRequestHandler.send_head(self)
+
+
+@contextlib.contextmanager
+def serve_directory(path, handler_class=RangeRequestHandler):
+    handler = functools.partial(handler_class, directory=str(path))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%i" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def make_table_spectrum(fname, npix=20000):
+    wave = np.linspace(3000., 9000., npix)
+    columns = [fits.Column(name='WAVE', format='%iD' % npix, array=[wave]),
+               fits.Column(name='FLUX', format='%iE' % npix, array=[np.ones(npix)]),
+               fits.Column(name='ERR', format='%iE' % npix, array=[0.1*np.ones(npix)]),
+               fits.Column(name='SKY', format='%iD' % (10*npix), array=[np.zeros(10*npix)])]
+    fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns(columns)]).writeto(fname)
+
+
+def make_image_spectrum(fname, npix=20000):
+    hdr = fits.Header({'CRVAL1': 3000., 'CRPIX1': 1., 'CDELT1': 0.5})
+    flux = fits.PrimaryHDU(np.ones(npix, dtype='f4'), header=hdr)
+    flux.header['EXTNAME'] = 'FLUX'
+    err = fits.ImageHDU(0.1*np.ones(npix, dtype='f4'), name='ERR')
+    sky = fits.ImageHDU(np.zeros((50, npix), dtype='f4'), name='SKY')
+    fits.HDUList([flux, err, sky]).writeto(fname)
+
+
+def test_range_reader(tmp_path):
+    """Test that a RangeReader returns the same bytes as the file and only fetches what is read"""
+    content = np.random.default_rng(1).bytes(500000)
+    (tmp_path / 'random.bin').write_bytes(content)
+    with serve_directory(tmp_path) as url:
+        reader = RangeReader(url + '/random.bin', block_size=2880)
+        assert reader.size == len(content)
+        reader.seek(123456)
+        assert reader.read(10000) == content[123456:133456]
+        reader.seek(-100, io.SEEK_END)
+        assert reader.read() == content[-100:]
+        assert reader.read(10) == b''
+        assert reader.bytes_transferred < 20000
+
+
+def test_range_requests_not_supported(tmp_path):
+    """Test that a server ignoring range requests raises an error instead of sending the whole file"""
+    (tmp_path / 'random.bin').write_bytes(b'0' * 500000)
+    with serve_directory(tmp_path, NoRangeRequestHandler) as url:
+        reader = RangeReader(url + '/random.bin', block_size=2880)
+        with pytest.raises(RemoteError):
+            reader.read(100)
+    assert reader.bytes_transferred == 0
+
+
+def test_remote_table_spectrum(tmp_path):
+    """Test that loading a remote table spectrum only downloads the spectral columns"""
+    make_table_spectrum(tmp_path / 'table.fits')
+    local = load_fits_spectrum(str(tmp_path / 'table.fits'))
+    file_size = (tmp_path / 'table.fits').stat().st_size
+    with serve_directory(tmp_path) as url:
+        reader = RangeReader(url + '/table.fits')
+        remote = load_fits_spectrum(reader)
+    for local_array, remote_array in zip(local[:4], remote[:4]):
+        assert np.all(local_array == remote_array)
+    assert reader.bytes_transferred < file_size / 2
+
+
+def test_remote_explicit_image(tmp_path):
+    """Test that loading a remote image spectrum skips the data of other extensions"""
+    make_image_spectrum(tmp_path / 'image.fits')
+    specs = {'EXT_NUM': 0, 'WAVE': 'From FITS Header', 'FLUX': 'FLUX', 'ERR': 'ERR'}
+    local = load_fits_explicit(str(tmp_path / 'image.fits'), specs)
+    file_size = (tmp_path / 'image.fits').stat().st_size
+    with serve_directory(tmp_path) as url:
+        reader = RangeReader(url + '/image.fits')
+        remote = load_fits_explicit(reader, specs)
+    for local_array, remote_array in zip(local[:4], remote[:4]):
+        assert np.all(local_array == remote_array)
+    assert reader.bytes_transferred < file_size / 10
+
+
+def test_read_table_rows(tmp_path):
+    """Test reading a subset of columns and rows of a remote table"""
+    n_rows = 100000
+    columns = [fits.Column(name='ID', format='K', array=np.arange(n_rows)),
+               fits.Column(name='NAME', format='8A', array=['row%i' % i for i in range(n_rows)]),
+               fits.Column(name='FLAG', format='L', array=np.arange(n_rows) % 2 == 0),
+               fits.Column(name='BIT', format='1X', array=(np.arange(n_rows) % 3 == 0).reshape(n_rows, 1)),
+               fits.Column(name='UINT', format='I', bzero=32768, array=np.arange(n_rows, dtype='u2')),
+               fits.Column(name='ULONG', format='K', bzero=2**63,
+                           array=2**64 - 1 - np.arange(n_rows, dtype='u8'))]
+    fits.BinTableHDU.from_columns(columns).writeto(tmp_path / 'rows.fits')
+    names = ['id', 'flag', 'bit', 'uint', 'ulong']
+    local = fits.getdata(tmp_path / 'rows.fits')[500:510]
+    with serve_directory(tmp_path) as url:
+        reader = RangeReader(url + '/rows.fits', block_size=2880)
+        with fits.open(reader) as hdu_list:
+            tbdata = read_table_columns(hdu_list[1], reader, names=names, rows=slice(500, 510))
+    assert tbdata.names == ['ID', 'FLAG', 'BIT', 'UINT', 'ULONG']
+    for name in tbdata.names:
+        assert tbdata[name].dtype == local[name].dtype
+        assert np.all(tbdata[name] == local[name])
+    assert tbdata['ULONG'][0] == 2**64 - 1 - 500
+    assert reader.n_requests <= 3
+
+
+def test_remote_batch(tmp_path):
+    """Test concurrent loading of several remote files through a shared connection pool"""
+    for num in range(6):
+        make_table_spectrum(tmp_path / ('spec%i.fits' % num), npix=1000)
+    pool = ConnectionPool()
+    with serve_directory(tmp_path) as url:
+        urls = [url + '/spec%i.fits' % num for num in range(6)]
+        results = load_remote_batch(load_fits_spectrum, urls, max_workers=2, pool=pool)
+    pool.close()
+    assert len(results) == 6
+    assert all(len(result[0]) == 1000 for result in results)
+    assert pool.n_connections < pool.n_requests
+    assert pool.bytes_transferred > 0
+
+
+def test_show_remote_table(tmp_path, capsys):
+    """Test that a remote table preview only downloads the first rows"""
+    columns = [fits.Column(name='ID', format='K', array=np.arange(100000)),
+               fits.Column(name='VALUE', format='D', array=np.ones(100000))]
+    fits.BinTableHDU.from_columns(columns).writeto(tmp_path / 'preview.fits')
+    with serve_directory(tmp_path) as url:
+        show_table(url + '/preview.fits', num=5)
+    output = capsys.readouterr().out
+    assert "Table Length: 100000 rows" in output
+    nbytes = int(re.search(r'Transferred: (\d+) bytes', output).group(1))
+    assert nbytes < (tmp_path / 'preview.fits').stat().st_size / 10